@@ -3,12 +3,27 @@
 Manga Chapter Merger Script
 
 This script merges multiple manga chapters into a single CBZ file with sequential page numbering.
-Given a range of chapters (e.g., 26-30), it will copy all images from those chapters
-into a temporary folder, rename them sequentially from 001 onwards, then compress
-everything into a CBZ file (Comic Book ZIP format).
+Given a range of chapters (e.g., 26-30), it will add all images from those chapters
+directly into a CBZ file (Comic Book ZIP format), renamed sequentially from 001 onwards.
+
+JPEG, PNG and WebP pages are stored uncompressed in the CBZ: they are already
+compressed formats, so running them through DEFLATE costs CPU time without
+making the file any smaller. Only BMP and GIF pages are deflated.
+
+If the optional `zlib-ng` or `isal` package is installed, it is used in place of
+the system zlib for that DEFLATE pass and for the CRC32 every entry needs, stored
+pages included. Both produce standard DEFLATE streams and checksums but use
+SIMD-optimized match searching and CRC folding, so CBZ creation gets faster with
+no change to the output format. ISA-L only implements DEFLATE levels 0-3, so
+with `isal` (and not `zlib-ng`) installed, --compress-level accepts 0-3 only.
 
 Usage:
-    python merge_manga_chapters.py [cover_image_path] <start_chapter> <end_chapter> [output_filename]
+    python merge_manga_chapters.py [options] [cover_image_path] <start_chapter> <end_chapter> [output_filename]
+
+Options:
+    --compress-level N   DEFLATE level (0-9, or 0-3 when using isal) for BMP/GIF pages, default 1
+    -v, --verbose        Print every page as it is added
+    -f, --force          Overwrite an existing CBZ without asking
 
 Example:
     python merge_manga_chapters.py 26 30
@@ -17,58 +32,180 @@ Example:
 """
 
 import os
-import shutil
 import sys
 import re
+import time
 import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Use a faster drop-in DEFLATE backend when one is installed
+MAX_COMPRESS_LEVEL = 9
+try:
+    from zlib_ng import zlib_ng as fast_zlib
+except ImportError:
+    try:
+        from isal import isal_zlib as fast_zlib
+        MAX_COMPRESS_LEVEL = 3  # ISA-L only implements levels 0-3
+    except ImportError:
+        fast_zlib = None
+
+if fast_zlib is not None:
+    zipfile.zlib = fast_zlib
+    # zipfile binds zlib.crc32 at import time, so it has to be swapped separately
+    zipfile.crc32 = fast_zlib.crc32
+
+# Chapter number in a folder name (supports decimals) and first number in a page name
+CHAPTER_RE = re.compile(r'Chapter ([\d\.]+)')
+PAGE_NUMBER_RE = re.compile(r'(\d+)')
+
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'})
 
 
 def find_chapter_folders(base_path, start_chapter, end_chapter):
     """Find all chapter folders within the specified range."""
     chapter_folders = []
     
-    # Get all directories in the base path
-    for item in os.listdir(base_path):
-        item_path = os.path.join(base_path, item)
-        if os.path.isdir(item_path):
-            # Extract chapter number from folder name (support decimals)
-            match = re.match(r'Chapter ([\d\.]+)', item)
-            if match:
-                chapter_num = float(match.group(1))
-                if start_chapter <= chapter_num <= end_chapter:
-                    chapter_folders.append((chapter_num, item_path))
+    # Get all directories in the base path (scandir gives us the entry type
+    # without an extra stat call per entry)
+    with os.scandir(base_path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                # Extract chapter number from folder name (support decimals)
+                match = CHAPTER_RE.match(entry.name)
+                if match:
+                    chapter_num = float(match.group(1))
+                    if start_chapter <= chapter_num <= end_chapter:
+                        chapter_folders.append((chapter_num, entry.path))
     # Sort by chapter number (float)
     chapter_folders.sort(key=lambda x: x[0])
     return chapter_folders
 
 
+def get_extension(filename):
+    """Get the lowercased extension of a bare filename (no directory part)."""
+    i = filename.rfind('.')
+    return filename[i:].lower() if i > 0 else ''
+
+
+def extract_number(filename):
+    """Get the first number in a filename, or 0 if it has none."""
+    match = PAGE_NUMBER_RE.search(filename)
+    return int(match.group(1)) if match else 0
+
+
 def get_image_files(folder_path):
-    """Get all image files from a folder, sorted by their numeric order."""
-    image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
+    """Get all image files from a folder, sorted by their numeric order.
+
+    Raises OSError if the folder can't be read, rather than returning an empty
+    list that would silently drop the chapter from the volume.
+    """
     image_files = []
+    add_image = image_files.append  # bound once, outside the per-entry loop
     
-    try:
-        for file in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, file)
-            if os.path.isfile(file_path):
-                _, ext = os.path.splitext(file.lower())
-                if ext in image_extensions:
-                    image_files.append((file, file_path))
-    except OSError as e:
-        print(f"Error reading folder {folder_path}: {e}")
-        return []
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                name = entry.name
+                if get_extension(name) in IMAGE_EXTENSIONS:
+                    # Decorate with the sort key so the regex runs once per file
+                    add_image((extract_number(name), name, entry.path))
     
-    # Sort by numeric value in filename
-    def extract_number(filename):
-        match = re.search(r'(\d+)', filename)
-        return int(match.group(1)) if match else 0
-    
-    image_files.sort(key=lambda x: extract_number(x[0]))
-    return image_files
+    # Sort by numeric value in filename (ties fall back to the filename)
+    image_files.sort()
+    return [(name, path) for _, name, path in image_files]
+
+
+def get_compress_type(ext):
+    """Get the ZIP compression method for an image with the given extension."""
+    # Only formats that aren't already tightly compressed benefit from DEFLATE
+    if ext in {'.bmp', '.gif'}:
+        return zipfile.ZIP_DEFLATED
+    return zipfile.ZIP_STORED
+
+
+def read_page(path, buffers, slot):
+    """Read a whole image file into buffers[slot], replacing it with a bigger one if needed.
+
+    Returns the file's stat result and a memoryview of its contents.
+    """
+    with open(path, 'rb', buffering=0) as page:
+        fd = page.fileno()
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        st = os.fstat(fd)
+        if len(buffers[slot]) < st.st_size:
+            buffers[slot] = bytearray(st.st_size)
+        view = memoryview(buffers[slot])
+        
+        size = 0
+        while size < st.st_size:
+            n = page.readinto(view[size:st.st_size])
+            if not n:
+                break
+            size += n
+        return st, view[:size]
+
+
+def read_ahead(paths, depth=4):
+    """Yield a future with the contents of each file, reading ahead in the background.
+
+    A single reader thread keeps up to `depth` files loaded while the caller
+    writes the previous ones, so disk reads overlap with CBZ writing (both
+    file I/O and zlib release the GIL). Read errors are raised by the
+    future's result() for the page they belong to.
+
+    Pages are read into a fixed ring of depth + 1 buffers that is reused for
+    the whole volume, so the contents of a yielded page are only valid until
+    the next one is requested.
+    """
+    # One buffer per page in flight plus the one the caller is writing
+    buffers = [bytearray(1 << 20) for _ in range(depth + 1)]
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = deque()
+        try:
+            for i, path in enumerate(paths):
+                pending.append(pool.submit(read_page, path, buffers, i % len(buffers)))
+                if len(pending) > depth:
+                    yield pending.popleft()
+            while pending:
+                yield pending.popleft()
+        finally:
+            # If the caller stops early (e.g. a page failed), don't keep
+            # reading pages nobody will write
+            for future in pending:
+                future.cancel()
+
+
+def add_page(cbz_file, arcname, page, compress_type, compress_level):
+    """Add an image file read by read_page to the CBZ under the given name.
+
+    The page is written with one writestr call instead of letting
+    ZipFile.write copy it through a fixed 8 KiB buffer, and its entry is
+    built from the stat taken while reading rather than stat-ing it again.
+    """
+    st, data = page
+    zinfo = zipfile.ZipInfo(arcname, time.localtime(st.st_mtime)[:6])
+    zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+    cbz_file.writestr(zinfo, data, compress_type=compress_type, compresslevel=compress_level)
+
+
+def merge_chapters(base_path, start_chapter, end_chapter, output_folder=None, cover_image_path=None,
+                   compress_level=1, verbose=False, force=False):
+    """Merge chapters within the specified range into a single CBZ file.
+
+    compress_level is the DEFLATE level used for the pages that are compressed
+    (BMP/GIF). Level 1 is several times faster than the zlib default and,
+    on image data, produces files of almost the same size.
 
+    Progress is reported once per chapter; pass verbose=True to also print
+    every page as it is added.
 
-def merge_chapters(base_path, start_chapter, end_chapter, output_folder=None, cover_image_path=None):
-    """Merge chapters within the specified range into a single folder and create CBZ file."""
+    An existing CBZ is only overwritten after asking, or straight away when
+    force=True. Without a terminal to ask on, it is left alone and the merge
+    fails unless force=True. Either way it is only replaced once the new
+    volume has been written completely.
+    """
     
     # Create output folder name if not provided
     if output_folder is None:
@@ -77,17 +214,21 @@ def merge_chapters(base_path, start_chapter, end_chapter, output_folder=None, co
         else:
             output_folder = f"Chapters_{start_chapter}-{end_chapter}_merged"
     
-    output_path = os.path.join(base_path, output_folder)
     cbz_filename = f"{output_folder}.cbz"
     cbz_path = os.path.join(base_path, cbz_filename)
+    # The volume is built under a temporary name and moved into place at the end
+    temp_path = os.path.join(base_path, f".{cbz_filename}.tmp")
     
     # Check if CBZ file already exists
     if os.path.exists(cbz_path):
-        response = input(f"CBZ file '{cbz_filename}' already exists. Overwrite? (y/N): ")
-        if response.lower() != 'y':
-            print("Operation cancelled.")
-            return False
-        os.remove(cbz_path)
+        if not force:
+            if not sys.stdin or not sys.stdin.isatty():
+                print(f"❌ CBZ file '{cbz_filename}' already exists. Use -f to overwrite it.")
+                return False
+            response = input(f"CBZ file '{cbz_filename}' already exists. Overwrite? (y/N): ")
+            if response.lower() != 'y':
+                print("Operation cancelled.")
+                return False
     
     # Validate cover image if provided
     if cover_image_path:
@@ -96,21 +237,13 @@ def merge_chapters(base_path, start_chapter, end_chapter, output_folder=None, co
             return False
         
         # Check if it's a valid image file
-        image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
-        _, ext = os.path.splitext(cover_image_path.lower())
-        if ext not in image_extensions:
-            print(f"❌ Invalid cover image format: {ext}. Supported formats: {', '.join(image_extensions)}")
+        ext = get_extension(os.path.basename(cover_image_path))
+        if ext not in IMAGE_EXTENSIONS:
+            print(f"❌ Invalid cover image format: {ext}. Supported formats: {', '.join(IMAGE_EXTENSIONS)}")
             return False
         
         print(f"📖 Using cover image: {os.path.basename(cover_image_path)}")
     
-    # Create temporary output directory
-    if os.path.exists(output_path):
-        shutil.rmtree(output_path)
-    
-    os.makedirs(output_path)
-    print(f"Created temporary folder: {output_path}")
-    
     # Find chapter folders
     chapter_folders = find_chapter_folders(base_path, start_chapter, end_chapter)
     
@@ -123,65 +256,68 @@ def merge_chapters(base_path, start_chapter, end_chapter, output_folder=None, co
         folder_name = os.path.basename(folder_path)
         print(f"  Chapter {chapter_num}: {folder_name}")
     
-    # Process cover image first if provided
+    # List every chapter's pages up front; the folders are scanned concurrently
+    # so slow (e.g. network or cold-cache) directory reads overlap
+    try:
+        with ThreadPoolExecutor() as pool:
+            chapter_pages = list(pool.map(get_image_files, [folder_path for _, folder_path in chapter_folders]))
+    except OSError as e:
+        # A chapter that can't be listed would be missing from the volume
+        print(f"❌ Error reading chapter folder: {e}")
+        return False
+    
+    # Pages are written straight into the CBZ under their new names, in the
+    # same order they're read ahead
+    print(f"\n📦 Creating CBZ file: {cbz_filename}")
     page_counter = 1
     total_pages = 0
     
+    page_paths = [original_path for image_files in chapter_pages for _, original_path in image_files]
     if cover_image_path:
-        print(f"\n📖 Processing cover image...")
-        _, ext = os.path.splitext(cover_image_path.lower())
-        cover_name = f"{page_counter:03d}{ext}"
-        cover_dest = os.path.join(output_path, cover_name)
-        
-        try:
-            shutil.copy2(cover_image_path, cover_dest)
-            print(f"    {os.path.basename(cover_image_path)} -> {cover_name} (COVER)")
-            page_counter += 1
-            total_pages += 1
-        except Exception as e:
-            print(f"    Error copying cover image: {e}")
-            return False
+        page_paths.insert(0, cover_image_path)
+    pages = read_ahead(page_paths)
     
-    # Process each chapter
-    for chapter_num, folder_path in chapter_folders:
-        print(f"\nProcessing Chapter {chapter_num}...")
-        
-        # Get all image files from this chapter
-        image_files = get_image_files(folder_path)
-        
-        if not image_files:
-            print(f"  No image files found in Chapter {chapter_num}")
-            continue
-        
-        print(f"  Found {len(image_files)} pages")
-        
-        # Copy and rename each image file
-        for original_name, original_path in image_files:
-            # Get file extension
-            _, ext = os.path.splitext(original_name.lower())
-            
-            # Create new filename with zero-padding
-            new_name = f"{page_counter:03d}{ext}"
-            new_path = os.path.join(output_path, new_name)
-            
-            try:
-                shutil.copy2(original_path, new_path)
-                print(f"    {original_name} -> {new_name}")
+    try:
+        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_STORED,
+                             compresslevel=compress_level) as cbz_file:
+            # Process cover image first if provided
+            if cover_image_path:
+                print(f"\n📖 Processing cover image...")
+                ext = get_extension(os.path.basename(cover_image_path))
+                cover_name = f"{page_counter:03d}{ext}"
+                
+                add_page(cbz_file, cover_name, next(pages).result(),
+                         get_compress_type(ext), compress_level)
+                print(f"    {os.path.basename(cover_image_path)} -> {cover_name} (COVER)")
                 page_counter += 1
                 total_pages += 1
-            except Exception as e:
-                print(f"    Error copying {original_name}: {e}")
-    
-    # Create CBZ file
-    print(f"\n📦 Creating CBZ file: {cbz_filename}")
-    try:
-        with zipfile.ZipFile(cbz_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as cbz_file:
-            for root, dirs, files in os.walk(output_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, output_path)
-                    cbz_file.write(file_path, arcname)
-                    print(f"    Added to CBZ: {arcname}")
+            
+            # Process each chapter
+            for (chapter_num, _), image_files in zip(chapter_folders, chapter_pages):
+                print(f"\nProcessing Chapter {chapter_num}...")
+                
+                if not image_files:
+                    print(f"  No image files found in Chapter {chapter_num}")
+                    continue
+                
+                # Add each image file under its sequential name
+                for original_name, _ in image_files:
+                    # Get file extension
+                    ext = get_extension(original_name)
+                    
+                    # Create new filename with zero-padding
+                    new_name = f"{page_counter:03d}{ext}"
+                    
+                    add_page(cbz_file, new_name, next(pages).result(),
+                             get_compress_type(ext), compress_level)
+                    if verbose:
+                        print(f"    {original_name} -> {new_name}")
+                    page_counter += 1
+                    total_pages += 1
+                
+                print(f"  Added {len(image_files)} pages")
+        
+        os.replace(temp_path, cbz_path)
         
         # Get CBZ file size
         cbz_size = os.path.getsize(cbz_path)
@@ -194,29 +330,55 @@ def merge_chapters(base_path, start_chapter, end_chapter, output_folder=None, co
         print(f"📁 CBZ file: {cbz_filename}")
         print(f"💾 File size: {cbz_size_mb:.2f} MB")
         
-        # Clean up temporary folder
-        print(f"\n🧹 Cleaning up temporary folder...")
-        shutil.rmtree(output_path)
-        
         return True
         
-    except Exception as e:
+    except (OSError, ValueError) as e:
+        # Any page failing means the volume would be incomplete, so stop here
         print(f"❌ Error creating CBZ file: {e}")
-        # Clean up temporary folder even if CBZ creation failed
-        if os.path.exists(output_path):
-            shutil.rmtree(output_path)
         return False
+    
+    finally:
+        # Runs for every exception (KeyboardInterrupt, MemoryError, zlib.error
+        # and so on): stop reading ahead and don't leave a partial CBZ behind.
+        # On success the temporary file has already been moved into place.
+        pages.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
 
 def main():
     """Main function to parse arguments and execute the merge."""
     
-    if len(sys.argv) < 3:
-        print("Usage: python merge_manga_chapters.py [cover_image_path] <start_chapter> <end_chapter> [output_filename]")
+    # Pull options out before parsing the positional arguments
+    args = []
+    compress_level = 1
+    verbose = False
+    force = False
+    argv = iter(sys.argv[1:])
+    for arg in argv:
+        if arg == '--compress-level':
+            value = next(argv, None)
+            if value not in [str(level) for level in range(MAX_COMPRESS_LEVEL + 1)]:
+                print(f"Error: --compress-level must be a number from 0 to {MAX_COMPRESS_LEVEL}")
+                sys.exit(1)
+            compress_level = int(value)
+        elif arg in ('-v', '--verbose'):
+            verbose = True
+        elif arg in ('-f', '--force'):
+            force = True
+        else:
+            args.append(arg)
+    
+    if len(args) < 2:
+        print("Usage: python merge_manga_chapters.py [options] [cover_image_path] <start_chapter> <end_chapter> [output_filename]")
         print("\nExamples:")
         print("  python merge_manga_chapters.py 26 30")
         print("  python merge_manga_chapters.py 'cover.jpg' 26 30")
         print("  python merge_manga_chapters.py 'cover.jpg' 26 30 'Volume_7'")
+        print("\nOptions:")
+        print(f"  --compress-level N   DEFLATE level (0-{MAX_COMPRESS_LEVEL}) for BMP/GIF pages, default 1")
+        print("  -v, --verbose        Print every page as it is added")
+        print("  -f, --force          Overwrite an existing CBZ without asking")
         print("\nNote: Output will be a CBZ file (Comic Book ZIP format)")
         print("      Cover image will be placed as the first page (001)")
         print("      Cover image path is optional and can be first parameter")
@@ -224,7 +386,6 @@ def main():
     
     try:
         # Parse arguments - cover image is optional and can be first parameter
-        args = sys.argv[1:]
         cover_image_path = None
         start_chapter = None
         end_chapter = None
@@ -279,7 +440,8 @@ def main():
         print(f"🔍 Searching for chapters {start_chapter}-{end_chapter} in: {base_path}")
         if cover_image_path:
             print(f"📖 Cover image: {cover_image_path}")
-        success = merge_chapters(base_path, start_chapter, end_chapter, output_folder, cover_image_path)
+        success = merge_chapters(base_path, start_chapter, end_chapter, output_folder, cover_image_path,
+                                 compress_level, verbose, force)
         if success:
             sys.exit(0)
         else: